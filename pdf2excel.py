@@ -1,7 +1,304 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pdfplumber
 import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+import xlsxwriter
+from xlsxwriter.utility import xl_col_to_name
+
+# Cache limits shared by all sessions: parsed PDFs and workbook bytes are large,
+# so keep only the most recent entries and expire them after an hour
+CACHE_MAX_ENTRIES = 10
+CACHE_TTL_SECONDS = 3600
+
+# Tables longer than this skip xlsxwriter and have their sheet XML generated directly
+LARGE_TABLE_ROWS = 50000
+
+# Largest sheet Excel will open
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLS = 16384
+
+# Control characters are written as Excel's _xHHHH_ escapes, the way xlsxwriter does,
+# and literal _xHHHH_ text gets its underscore escaped so it is not decoded
+CONTROL_CHARS = re.compile(r'([\x00-\x08\x0b-\x1f])')
+LITERAL_ESCAPE = re.compile(r'(_x[0-9a-fA-F]{4}_)')
+
+# Numbers written with a leading zero (IDs, ZIP codes) must stay text
+LEADING_ZERO = r'\s*[+-]?0\d'
+
+# Exponent notation is far more often a part or lot code (2E10) than a number
+EXPONENT = r'[eE]'
+
+# Excel keeps 15 significant digits; longer numbers (account numbers, long IDs) must stay text
+MAX_EXACT_DIGITS = 15
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Static parts of a minimal single-sheet workbook
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        XML_DECLARATION +
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        XML_DECLARATION +
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        XML_DECLARATION +
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Data" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        XML_DECLARATION +
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Cell format 1 is the bold, bordered, centered header used by the xlsxwriter path
+    'xl/styles.xml': (
+        XML_DECLARATION +
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2">'
+        '<font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font>'
+        '</fonts>'
+        '<fills count="2">'
+        '<fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill>'
+        '</fills>'
+        '<borders count="2">'
+        '<border><left/><right/><top/><bottom/><diagonal/></border>'
+        '<border><left style="thin"><color auto="1"/></left><right style="thin"><color auto="1"/></right>'
+        '<top style="thin"><color auto="1"/></top><bottom style="thin"><color auto="1"/></bottom>'
+        '<diagonal/></border>'
+        '</borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" '
+        'applyFont="1" applyBorder="1" applyAlignment="1"><alignment horizontal="center"/></xf>'
+        '</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+
+def parse_numbers(column):
+    """Parse a text column as numbers, or return None when it has to stay text."""
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return None
+    numbers = pd.to_numeric(column, errors='coerce')
+    if not numbers.notna().all():
+        return None
+    text = column.astype(str)
+    if (text.str.match(LEADING_ZERO).any()
+            or text.str.contains(EXPONENT).any()
+            or text.str.count(r'\d').max() > MAX_EXACT_DIGITS):
+        return None
+    return numbers
+
+
+def diet(df):
+    """Prepare a table for export: numeric text becomes numbers, so Excel stores them as numbers."""
+    for i in range(len(df.columns)):
+        numbers = parse_numbers(df.iloc[:, i])
+        # Kept as int64/float64: the writers box every cell into a Python object anyway,
+        # and float32 would show up in Excel as 1.100000023841858
+        if numbers is not None and np.isfinite(numbers).all():
+            df.isetitem(i, numbers)
+    return df
+
+
+def escape_cell_text(text):
+    """Escape text for an inline string cell, matching xlsxwriter's output."""
+    text = LITERAL_ESCAPE.sub(r'_x005F\1', text)
+    text = CONTROL_CHARS.sub(lambda match: f'_x{ord(match.group(1)):04X}_', text)
+    text = text.replace('\ufffe', '_xFFFE_').replace('\uffff', '_xFFFF_')
+    return escape(text)
+
+
+def xml_row(row_num, refs, numeric, values, style=''):
+    """Render one worksheet <row> element, leaving out missing values and empty strings.
+
+    style is an optional cell attribute such as ' s="1"' applied to every cell.
+    """
+    cells = []
+    for ref, is_number, value in zip(refs, numeric, values):
+        # xlsxwriter writes both as blank cells, which are left out of the sheet
+        if value is None or value == '':
+            continue
+        if is_number:
+            cells.append(f'<c r="{ref}{row_num}"{style}><v>{value}</v></c>')
+        else:
+            text = escape_cell_text(str(value))
+            cells.append(
+                f'<c r="{ref}{row_num}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+            )
+    return f'<row r="{row_num}">{"".join(cells)}</row>'
+
+
+def df_to_xlsx_stream(df, out):
+    """Write a DataFrame to a minimal .xlsx file by generating the sheet XML directly."""
+    refs = [xl_col_to_name(i) for i in range(len(df.columns))]
+    numeric = [
+        pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        for dtype in df.dtypes
+    ]
+    values = df.astype(object).where(df.notna(), None)
+    
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in XLSX_PARTS.items():
+            zf.writestr(name, xml)
+        
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                XML_DECLARATION +
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>' +
+                xml_row(1, refs, [False] * len(refs), df.columns, style=' s="1"')
+            ).encode('utf-8'))
+            for row_num, row in enumerate(values.itertuples(index=False, name=None), 2):
+                sheet.write(xml_row(row_num, refs, numeric, row).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+
+
+@st.cache_data(show_spinner=False, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+def extract_tables(pdf_bytes, table_strategy):
+    """Extract every table that has a header and at least one data row from a PDF.
+
+    Cached on the file contents, so reruns triggered by later widgets do not re-parse the PDF.
+    Returns the list of tables and the number of pages.
+    """
+    # Use pdfplumber to extract tables
+    table_settings = {
+        "vertical_strategy": table_strategy,
+        "horizontal_strategy": table_strategy,
+        "snap_tolerance": 3
+    }
+    all_tables = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        page_count = len(pdf.pages)
+        for page_num, page in enumerate(pdf.pages, 1):
+            # Extract tables from the page
+            page_tables = page.extract_tables(table_settings)
+            
+            if page_tables:
+                for table_num, table in enumerate(page_tables, 1):
+                    if table and len(table) > 1:  # Must have header and at least one data row
+                        # First row is header
+                        headers = table[0]
+                        data_rows = table[1:]
+                        
+                        # Clean headers - remove None and empty strings (strip each header once)
+                        stripped_headers = [str(h).strip() if h else "" for h in headers]
+                        cleaned_headers = [
+                            h if h else f"Column_{i+1}"
+                            for i, h in enumerate(stripped_headers)
+                        ]
+                        
+                        # Create DataFrame
+                        try:
+                            # Remove completely empty rows and columns in one pass over the cells,
+                            # then build the DataFrame once from what is left. Rows of '' cells are
+                            # padding from the 'text' strategy; columns with a real header are kept
+                            # unless every cell is None, untitled ones also when every cell is ''
+                            arr = np.array(data_rows, dtype=object)
+                            notna = pd.notna(arr)
+                            filled = notna & (arr != '')
+                            row_mask = filled.any(axis=1)
+                            titled = np.array([h != "" for h in stripped_headers])
+                            col_mask = np.where(titled, notna.any(axis=0), filled.any(axis=0))
+                            if not (row_mask.all() and col_mask.all()):
+                                arr = arr[row_mask][:, col_mask]
+                                cleaned_headers = [h for h, keep in zip(cleaned_headers, col_mask) if keep]
+                            df_temp = pd.DataFrame(arr, columns=cleaned_headers)
+                            
+                            if not df_temp.empty and len(df_temp.columns) > 0:
+                                all_tables.append({
+                                    'df': df_temp,
+                                    'page': page_num,
+                                    'table_num': table_num,
+                                    'rows': len(df_temp),
+                                    'cols': len(df_temp.columns),
+                                    'headers': list(df_temp.columns)
+                                })
+                        except Exception as e:
+                            st.warning(f"Could not parse table {table_num} on page {page_num}: {str(e)}")
+    
+    return all_tables, page_count
+
+
+def hash_dataframe(df):
+    """Cache key for a DataFrame covering every cell (Streamlit's default hash samples large tables)."""
+    return (
+        tuple(df.columns),
+        tuple(str(dtype) for dtype in df.dtypes),
+        pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+    )
+
+
+@st.cache_data(
+    show_spinner=False,
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl=CACHE_TTL_SECONDS,
+    hash_funcs={pd.DataFrame: hash_dataframe}
+)
+def build_xlsx(df):
+    """Write a DataFrame to a single-sheet Excel workbook and return the file bytes."""
+    if len(df) + 1 > EXCEL_MAX_ROWS or len(df.columns) > EXCEL_MAX_COLS:
+        raise ValueError(
+            f"Table has {len(df)} rows and {len(df.columns)} columns; an Excel sheet holds at most "
+            f"{EXCEL_MAX_ROWS - 1} data rows and {EXCEL_MAX_COLS} columns"
+        )
+    df = diet(df.copy())
+    output = io.BytesIO()
+    if len(df) > LARGE_TABLE_ROWS:
+        df_to_xlsx_stream(df, output)
+        return output.getvalue()
+    
+    # constant_memory flushes each row as soon as the next one starts, so cells
+    # must be written row by row (pandas' to_excel writes column by column)
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'strings_to_numbers': False,
+        'strings_to_urls': False
+    })
+    worksheet = workbook.add_worksheet('Data')
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+    worksheet.write_row(0, 0, list(df.columns), header_format)
+    
+    # Missing values are written as blank cells, like pandas' default na_rep
+    values = df.astype(object).where(df.notna(), None)
+    for row_num, row in enumerate(values.itertuples(index=False, name=None), 1):
+        worksheet.write_row(row_num, 0, row)
+    
+    workbook.close()
+    return output.getvalue()
+
 
 st.set_page_config(page_title="PDF to Excel Converter", layout="wide")
 
@@ -20,61 +317,25 @@ if 'column_order' not in st.session_state:
 st.header("Step 1: Upload PDF File")
 uploaded_file = st.file_uploader("Choose a PDF file", type=['pdf'])
 
+table_strategy = st.selectbox(
+    "Table detection strategy",
+    ["lines", "text"],
+    index=0,
+    help="'lines' follows the visible borders of the table. "
+         "Switch to 'text' for tables without borders; columns are then found from word alignment."
+)
+
 if uploaded_file is not None:
     try:
         # Read PDF and extract tables
         with st.spinner("Reading PDF and extracting tables..."):
-            pdf_bytes = uploaded_file.read()
-            
-            # Use pdfplumber to extract tables
-            all_tables = []
-            with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    # Extract tables from the page
-                    page_tables = page.extract_tables()
-                    
-                    if page_tables:
-                        for table_num, table in enumerate(page_tables, 1):
-                            if table and len(table) > 1:  # Must have header and at least one data row
-                                # First row is header
-                                headers = table[0]
-                                data_rows = table[1:]
-                                
-                                # Clean headers - remove None and empty strings
-                                cleaned_headers = []
-                                for i, h in enumerate(headers):
-                                    if h and str(h).strip():
-                                        cleaned_headers.append(str(h).strip())
-                                    else:
-                                        cleaned_headers.append(f"Column_{i+1}")
-                                
-                                # Create DataFrame
-                                try:
-                                    df_temp = pd.DataFrame(data_rows, columns=cleaned_headers)
-                                    
-                                    # Remove completely empty rows
-                                    df_temp = df_temp.dropna(how='all')
-                                    
-                                    # Remove completely empty columns
-                                    df_temp = df_temp.dropna(axis=1, how='all')
-                                    
-                                    if not df_temp.empty and len(df_temp.columns) > 0:
-                                        all_tables.append({
-                                            'df': df_temp,
-                                            'page': page_num,
-                                            'table_num': table_num,
-                                            'rows': len(df_temp),
-                                            'cols': len(df_temp.columns),
-                                            'headers': list(df_temp.columns)
-                                        })
-                                except Exception as e:
-                                    st.warning(f"Could not parse table {table_num} on page {page_num}: {str(e)}")
+            all_tables, page_count = extract_tables(uploaded_file.getvalue(), table_strategy)
             
             if len(all_tables) == 0:
                 st.error("❌ No tables found in the PDF file.")
-                st.info("**Tips:**\n- Make sure your PDF contains tables with clear rows and columns\n- The PDF should not be a scanned image\n- Tables should have visible borders or clear structure")
+                st.info("**Tips:**\n- Make sure your PDF contains tables with clear rows and columns\n- The PDF should not be a scanned image\n- Tables should have visible borders or clear structure\n- Try the other table detection strategy")
             else:
-                st.success(f"✅ Found {len(all_tables)} table(s) across {len(pdf.pages)} page(s)!")
+                st.success(f"✅ Found {len(all_tables)} table(s) across {page_count} page(s)!")
                 
                 # Option to merge tables or select individual table
                 if len(all_tables) > 1:
@@ -89,7 +350,7 @@ if uploaded_file is not None:
                     if merge_option == "Merge all tables into one":
                         # Check if all tables have the same columns
                         first_headers = set(all_tables[0]['headers'])
-                        same_structure = all([set(t['headers']) == first_headers for t in all_tables])
+                        same_structure = all(set(t['headers']) == first_headers for t in all_tables)
                         
                         if same_structure:
                             # Merge all tables
@@ -169,51 +430,36 @@ if st.session_state.df is not None:
     if st.session_state.selected_columns:
         st.header("Step 3: Reorder Columns")
         
-        st.write("Drag column names to reorder them (or use the dropdowns below):")
-        
-        # Show current order
-        st.info(f"Current order: {' → '.join(st.session_state.selected_columns)}")
-        
-        # Initialize column order if not set
-        if 'column_order' not in st.session_state or set(st.session_state.column_order) != set(st.session_state.selected_columns):
-            st.session_state.column_order = st.session_state.selected_columns.copy()
-        
-        # Create a reordering interface using selectboxes
-        reordered = []
-        available_cols = st.session_state.selected_columns.copy()
+        # With every column selected the original order is kept unless the user asks to
+        # change it, so the order editor is only built on demand
+        reorder = not select_all or st.checkbox("Change column order", key="user_reordered")
         
-        st.write("**Select columns in the desired order:**")
-        
-        for position in range(len(st.session_state.selected_columns)):
-            col_label, col_selector = st.columns([1, 4])
+        if reorder:
+            st.write("Change the **Order** numbers to reorder the columns (lower numbers come first):")
             
-            with col_label:
-                st.write(f"**Position {position + 1}:**")
+            # A single data editor holds the whole ordering, instead of one selectbox per position
+            order_df = pd.DataFrame({
+                "column": st.session_state.selected_columns,
+                "order": range(1, len(st.session_state.selected_columns) + 1)
+            })
+            edited_order = st.data_editor(
+                order_df,
+                column_config={
+                    "column": st.column_config.TextColumn("Column", disabled=True),
+                    "order": st.column_config.NumberColumn("Order", min_value=1, step=1, required=True)
+                },
+                hide_index=True,
+                num_rows="fixed",
+                use_container_width=True
+            )
             
-            with col_selector:
-                # Default to maintaining current order if it exists
-                if position < len(st.session_state.column_order):
-                    default_col = st.session_state.column_order[position]
-                    if default_col in available_cols:
-                        default_idx = available_cols.index(default_col)
-                    else:
-                        default_idx = 0
-                else:
-                    default_idx = 0
-                
-                selected = st.selectbox(
-                    f"pos_{position}",
-                    available_cols,
-                    index=default_idx,
-                    key=f"col_order_{position}",
-                    label_visibility="collapsed"
-                )
-                
-                reordered.append(selected)
-                available_cols.remove(selected)
+            # Update the column order in session state
+            st.session_state.column_order = edited_order.sort_values("order", kind="stable")["column"].tolist()
+        else:
+            st.session_state.column_order = st.session_state.selected_columns
         
-        # Update the column order in session state
-        st.session_state.column_order = reordered
+        # Show current order
+        st.info(f"Current order: {' → '.join(st.session_state.column_order)}")
         
         # Step 4: Preview and Download
         st.header("Step 4: Download Excel File")
@@ -234,26 +480,28 @@ if st.session_state.df is not None:
         st.markdown("---")
         
         # Convert to Excel
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            final_df.to_excel(writer, index=False, sheet_name='Data')
-        
-        excel_data = output.getvalue()
+        try:
+            excel_data = build_xlsx(final_df)
+        except ValueError as e:
+            excel_data = None
+            st.error(f"❌ Could not create the Excel file: {str(e)}")
+            st.info("Select fewer columns or a single table so the data fits on one Excel sheet.")
         
-        # Download button with prominent styling
-        st.markdown("### 📥 Your Excel file is ready!")
-        
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            st.download_button(
-                label="⬇️ Download Excel File",
-                data=excel_data,
-                file_name="converted_data.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
-        
-        st.success("✅ Click the button above to download your Excel file!")
+        if excel_data is not None:
+            # Download button with prominent styling
+            st.markdown("### 📥 Your Excel file is ready!")
+            
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col2:
+                st.download_button(
+                    label="⬇️ Download Excel File",
+                    data=excel_data,
+                    file_name="converted_data.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
+                )
+            
+            st.success("✅ Click the button above to download your Excel file!")
     else:
         st.warning("Please select at least one column to proceed.")
 
@@ -261,9 +509,9 @@ if st.session_state.df is not None:
 with st.sidebar:
     st.header("📖 Instructions")
     st.markdown("""
-    1. **Upload PDF**: Click 'Browse files' and select your PDF file
+    1. **Upload PDF**: Click 'Browse files' and select your PDF file (switch the detection strategy to 'text' for tables without borders)
     2. **Select Columns**: Choose which columns to include in the Excel file
-    3. **Reorder Columns**: Use ↑ and ↓ buttons to change column order
+    3. **Reorder Columns**: Tick 'Change column order' (when all columns are selected) and change the order numbers
     4. **Download**: Click the download button to get your Excel file
     
     ---